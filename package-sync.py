@@ -1,11 +1,31 @@
+import io
 import json
+import mmap
 import subprocess
 import os
 from pathlib import Path
-from datetime import datetime
+from urllib.parse import quote, unquote
+from datetime import datetime, timezone
 import argparse
+import collections
 import shutil
-from typing import TypeAlias, Dict, List, Set, Any, Optional, Tuple, Literal 
+import signal
+import functools
+import threading
+import time
+import random
+import struct
+import socket
+import selectors
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import (
+    TypeAlias, Dict, List, Any, Optional, Tuple, Literal, Callable
+)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the json module
+    orjson = None
 
 # Type aliases for better clarity
 MachineConfig: TypeAlias = Dict[str, Dict[str, Any]]
@@ -13,25 +33,92 @@ LastChanges: TypeAlias = Dict[str, Any]
 ConfigDict: TypeAlias = Dict[str, Optional[str] | MachineConfig | LastChanges]
 
 
-CONFIG_PATH = Path("~/.config/package-sync/config.jsonfig.json").expanduser()
+CONFIG_DIR = Path("~/.config/package-sync").expanduser()
+# Primary machine designation and sync information
+INDEX_PATH = CONFIG_DIR / "index.json"
+# One <machine_name>.json file with the package state of each machine
+MACHINES_DIR = CONFIG_DIR / "machines"
+# Single-file configuration used by earlier versions, migrated on first load
+LEGACY_CONFIG_PATH = CONFIG_DIR / "config.jsonfig.json"
+CACHE_DIR = Path("~/.cache/package-sync").expanduser()
+PKG_CACHE_PATH = CACHE_DIR / "pkgcache.json"
+
+# Parsed configuration files by path, with the (st_mtime_ns, st_size) they
+# were parsed at, see read_config_file
+CONFIG_FILE_CACHE: Dict[Path, tuple[tuple[int, int], Any]] = {}
+
+# Serializes access to PKG_CACHE_PATH between concurrent package queries
+PKG_CACHE_LOCK = threading.Lock()
+
+# Keeps lines printed by concurrently running commands from interleaving
+OUTPUT_LOCK = threading.Lock()
+
+# Process groups of the commands currently run by tail_command. Only the main
+# thread receives KeyboardInterrupt, so it kills the groups started by worker
+# threads through this set, see kill_running_commands.
+RUNNING_GROUPS: set[int] = set()
+RUNNING_GROUPS_LOCK = threading.Lock()
+
+# Supported package managers, in the alphabetical order they are displayed in
+PKG_TYPES: tuple[str, ...] = ("brew", "flatpak", "pipx")
+
+# Upper bound on package installs/removals running at the same time
+MAX_PARALLEL_JOBS = 4
+
+# Package managers updated successfully within this many seconds are not
+# updated again by --update
+UPDATE_MAX_AGE = 3600
+
+# Number of trailing output lines of an update that are kept and printed
+UPDATE_OUTPUT_LINES = 50
+
+
+def build_dns_query(query_id: int, name: str = "example.com") -> bytes:
+    r"""Build a minimal DNS query for the A record of a name.
+
+    Args:
+        query_id: 16-bit ID that the server echoes back in its response
+        name: Domain name to query
+
+    Returns:
+        bytes: The DNS query message, ready to be sent over UDP
+
+    """
+    # ID, flags (recursion desired), 1 question, 0 answer/authority/additional
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label.encode() for label in name.split(".")
+    )
+    # Terminating root label, type A, class IN
+    return header + qname + b"\x00" + struct.pack("!HH", 1, 1)
 
 
 def check_internet_connection(
-    hosts: list[str] | None = None
+    hosts: list[str] | None = None,
+    port: int = 53,
+    timeout: float = 2.0,
 ) -> tuple[bool, float | None]:
-    r"""Check internet connectivity by pinging multiple reliable hosts.
+    r"""Check internet connectivity by querying multiple reliable DNS servers.
 
     If no hosts are provided, checks connectivity using well-known DNS servers
-    (Google DNS, Cloudflare DNS, and OpenDNS). Each host is pinged with a 2-second
-    timeout. Returns both connection status and best observed latency.
+    (Google DNS, Cloudflare DNS, and OpenDNS). A DNS query is sent over UDP to
+    every host at once from non-blocking sockets, so no external ping process
+    is needed, and the round-trip time until each answer arrives is measured.
+    Since all queries start together, the first answer is also the fastest
+    one, and the check returns as soon as it arrives instead of waiting for
+    the remaining hosts. It takes at most the timeout if no host responds.
+    Returns both connection status and best observed latency.
 
     Args:
-        hosts: List of host IP addresses to ping. If None, uses default DNS servers.
+        hosts: List of DNS server IP addresses to query. If None, uses default
+        DNS servers.
+        port: UDP port the DNS servers listen on
+        timeout: Maximum time in seconds to wait for an answer
 
     Returns:
         A tuple containing:
             - A boolean indicating if any host responded successfully
-            - The best response time in milliseconds, or None if all pings failed
+            - The best response time in milliseconds, or None if all queries failed
 
     Example:
         >>> is_connected, latency = check_internet_connection()
@@ -47,100 +134,357 @@ def check_internet_connection(
         ]
 
     best_latency: float | None = None
-    for host in hosts:
-        try:
-            result = subprocess.run(
-                ["ping", "-c", "1", "-W", "2", host],
-                capture_output=True,
-                text=True,
-            )
-            if result.returncode == 0:
-                # Extract time from ping output
+    selector = selectors.DefaultSelector()
+    deadline = time.perf_counter() + timeout
+    try:
+        for host in hosts:
+            query_id = random.getrandbits(16)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            start = time.perf_counter()
+            try:
+                sock.connect((host, port))
+                sock.send(build_dns_query(query_id))
+            except OSError:
+                sock.close()
+                continue
+            selector.register(sock, selectors.EVENT_READ, (query_id, start))
+
+        while best_latency is None and selector.get_map():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                query_id, start = key.data
+                latency = (time.perf_counter() - start) * 1000
+                sock = key.fileobj
                 try:
-                    time_str = result.stdout.split("time=")[1].split()[0]
-                    latency = float(time_str)
-                    if best_latency is None or latency < best_latency:
-                        best_latency = latency
-                except (IndexError, ValueError):
+                    response = sock.recv(512)
+                except OSError:  # e.g. ICMP port unreachable
+                    selector.unregister(sock)
+                    sock.close()
                     continue
-        except subprocess.SubprocessError:
-            continue
+                # Ignore anything that isn't the answer to our query
+                if len(response) < 12:
+                    continue
+                response_id, flags = struct.unpack("!HH", response[:4])
+                if response_id != query_id or not flags & 0x8000:
+                    continue
+                selector.unregister(sock)
+                sock.close()
+                if best_latency is None or latency < best_latency:
+                    best_latency = latency
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
 
     return best_latency is not None, best_latency
 
 
-def load_config() -> Dict[str, Any]:
-    r"""Load the configuration file or create a new one if it doesn't exist.
+def json_default(obj: Any) -> Any:
+    r"""Serialize objects the JSON encoders don't support natively.
+
+    Sets are encoded as sorted lists while the document is being written, so
+    nested configuration dictionaries don't need to be copied beforehand.
+
+    Args:
+        obj: The object the encoder could not serialize
 
     Returns:
-        Dict[str, Any]: A configuration dictionary with the structure:
-            {
-                "primary_machine": Optional[str],
-                "machines": Dict[str, Dict[str, Any]],
-                "last_changes": Dict[str, Any]
-            }
+        list: The sorted elements if obj is a set
+
+    Raises:
+        TypeError: If obj is of any other type
+
+    Examples:
+        >>> json_default({3, 1, 2})
+        [1, 2, 3]
+
+    """
+    if isinstance(obj, set):
+        return sorted(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_loads(data: bytes | str | memoryview) -> Any:
+    r"""Deserialize a JSON document, using orjson if it is installed.
+
+    Args:
+        data: The JSON document. orjson parses memoryviews in place, the json
+        module fallback copies them to bytes first.
+
+    Returns:
+        The deserialized Python object
+
+    Raises:
+        json.JSONDecodeError: If the document is not valid JSON
+
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def json_dumps(obj: Any, pretty: bool = True) -> bytes:
+    r"""Serialize an object to JSON, using orjson if it is installed.
+
+    Args:
+        obj: The object to serialize
+        pretty: Indent the output by two spaces and sort object keys
+
+    Sets are serialized as sorted lists, see json_default.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document
+
+    Raises:
+        TypeError: If the object contains types that can't be JSON serialized
+
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS if pretty else 0
+        return orjson.dumps(obj, default=json_default, option=option)
+    if pretty:
+        return json.dumps(
+            obj, default=json_default, indent=2, sort_keys=True
+        ).encode()
+    return json.dumps(obj, default=json_default, separators=(",", ":")).encode()
+
+
+def read_json_file(path: Path) -> Any:
+    r"""Read and deserialize a JSON file.
+
+    The file is memory-mapped and the mapping is handed to the JSON parser
+    directly, avoiding a buffered read and a copy of the file contents.
+
+    Args:
+        path: The JSON file to read
+
+    Returns:
+        The deserialized Python object
+
+    Raises:
+        OSError: If the file can't be opened
+        ValueError: If the file is empty or not valid JSON
+            (json.JSONDecodeError is a subclass of ValueError)
 
     """
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as data:
+                return json_loads(data)
+
+
+def write_file_atomic(path: Path, data: bytes, durable: bool = True) -> None:
+    r"""Replace the contents of a file atomically.
+
+    The data is written to a temporary file next to path, which is then
+    renamed over path. Readers see either the old or the new contents, never a
+    partially written file.
 
-    if CONFIG_PATH.exists():
+    Args:
+        path: The file to write
+        data: The new contents of the file
+        durable: Flush the temporary file to disk before the rename and the
+        directory entry after it, so that the new contents also survive a
+        crash or power loss
+
+    Raises:
+        OSError: If there are filesystem permission issues or other IO errors
+
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    if durable:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
         try:
-            with Path.open(CONFIG_PATH) as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            backup_path = CONFIG_PATH.with_suffix(".json.bak")
-            print(f"Config file corrupted. Backing up to {backup_path}")
-            shutil.copy(CONFIG_PATH, backup_path)
-
-    config: Dict[str, Any] = {
-        "primary_machine": None,
-        "machines": {},
-        "last_changes": {}
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def get_machine_path(machine_name: str) -> Path:
+    r"""Get the path of the file holding a machine's package state.
+
+    The machine name is percent-encoded so that any name maps to a single
+    file inside MACHINES_DIR.
+
+    Args:
+        machine_name: String name of the machine
+
+    Returns:
+        Path: The machine's JSON file, which may not exist yet
+
+    """
+    return MACHINES_DIR / f"{quote(machine_name, safe='')}.json"
+
+
+def list_machines() -> set[str]:
+    r"""List the machines that have a package state file in MACHINES_DIR.
+
+    Returns:
+        set[str]: The machine names
+
+    """
+    return {unquote(path.stem) for path in MACHINES_DIR.glob("*.json")}
+
+
+def read_config_file(
+    path: Path,
+    postprocess: Callable[[Any], Any] | None = None,
+) -> Any:
+    r"""Read a JSON configuration file, backing it up if it is corrupted.
+
+    Parsed files are kept in CONFIG_FILE_CACHE for the lifetime of the
+    process. A file is only read and parsed again once its modification time
+    or size changed, so repeated loads of an unchanged configuration are
+    nearly free. The returned object is shared between calls and must not be
+    modified in place.
+
+    Args:
+        path: The configuration file to read
+        postprocess: Optional function applied to the deserialized contents
+        before they are cached, so its work is done once per file version
+
+    Returns:
+        The deserialized file contents, or None if the file doesn't exist or
+        is corrupted. A corrupted file is copied to a .bak file next to it.
+
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = CONFIG_FILE_CACHE.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    try:
+        data = read_json_file(path)
+    except ValueError:  # Invalid JSON or an empty file
+        backup_path = path.with_suffix(path.suffix + ".bak")
+        print(f"Config file corrupted. Backing up to {backup_path}")
+        shutil.copy(path, backup_path)
+        return None
+
+    if postprocess is not None:
+        data = postprocess(data)
+    CONFIG_FILE_CACHE[path] = (version, data)
+    return data
+
+
+def machine_state_from_json(state: Dict[str, Any]) -> Dict[str, Any]:
+    r"""Convert a machine state read from JSON to its in-memory form.
+
+    JSON has no sets, so package lists are stored as lists. They are
+    converted to sets once at load time, so the sync can diff them directly.
+
+    Args:
+        state: Machine state as deserialized from its JSON file
+
+    Returns:
+        Dict[str, Any]: The machine state with package sets
+
+    """
+    packages = state.get("packages", {})
+    return {
+        **state,
+        "packages": {pkg_type: set(pkgs) for pkg_type, pkgs in packages.items()},
     }
+
+
+def migrate_legacy_config() -> None:
+    r"""Split the single-file configuration of earlier versions.
+
+    Writes INDEX_PATH and one file per machine from LEGACY_CONFIG_PATH. The
+    legacy file is then renamed with a .migrated suffix, so it can't be
+    migrated again over newer machine files if INDEX_PATH is ever removed.
+
+    """
+    config = read_config_file(LEGACY_CONFIG_PATH)
+    if config is None:
+        return
+    print(f"Migrating {LEGACY_CONFIG_PATH} to {CONFIG_DIR}")
     save_config(config)
-    return config
+    LEGACY_CONFIG_PATH.rename(
+        LEGACY_CONFIG_PATH.with_name(LEGACY_CONFIG_PATH.name + ".migrated")
+    )
 
 
-def sets_to_lists(obj: Dict | Set | Any) -> Dict | List | Any:
-    r"""Convert all Set objects to sorted Lists within a nested dictionary structure.
+def load_config(machine_names: List[str] | None = None) -> Dict[str, Any]:
+    r"""Load the configuration or create a new one if it doesn't exist.
 
-    This function recursively traverses a nested dictionary and converts any Set objects 
-    it encounters into sorted Lists. Other types are left unchanged. This is useful for 
-    preparing nested data structures for JSON serialization, since JSON does not support
-    Set types.
+    Only the package states of the requested machines are read, so the cost
+    of loading doesn't grow with the number of machines being synced.
 
     Args:
-        obj: The object to process. Can be:
-            - A Dict with arbitrary nesting of Dicts and Sets
-            - A Set of hashable elements
-            - Any other type (which will be returned unchanged)
+        machine_names: Machines whose package state to load. The primary
+        machine is always loaded. If None, all machines are loaded.
 
     Returns:
-        The input object with all Sets converted to sorted Lists:
-            - Dicts are processed recursively
-            - Sets are converted to sorted Lists
-            - All other types are returned as-is
+        Dict[str, Any]: A configuration dictionary with the structure:
+            {
+                "primary_machine": Optional[str],
+                "machines": Dict[str, Dict[str, Any]],
+                "last_changes": Dict[str, Any]
+            }
+        "machines" only contains the loaded machines that have a state file.
+        Their package lists are returned as sets.
 
-    Examples:
-        >>> sets_to_lists({'a': {1, 2}, 'b': {'c': {3, 1}, 'd': 5}})
-        {'a': [1, 2], 'b': {'c': [1, 3], 'd': 5}}
-        >>> sets_to_lists({1, 3, 2})
-        [1, 2, 3]
-        >>> sets_to_lists(42)
-        42
     """
-    if isinstance(obj, dict):
-        return {key: sets_to_lists(value) for key, value in obj.items()}
-    elif isinstance(obj, set):
-        return sorted(list(obj))
-    return obj
+    MACHINES_DIR.mkdir(parents=True, exist_ok=True)
+
+    if not INDEX_PATH.exists() and LEGACY_CONFIG_PATH.exists():
+        migrate_legacy_config()
+
+    index = read_config_file(INDEX_PATH)
+    if index is None:
+        index = {"primary_machine": None, "last_changes": {}}
+        write_file_atomic(INDEX_PATH, json_dumps(index))
+
+    primary_machine = index.get("primary_machine")
+    if machine_names is None:
+        names = list_machines()
+    else:
+        names = set(machine_names)
+        if primary_machine is not None:
+            names.add(primary_machine)
+
+    machines: MachineConfig = {}
+    for name in sorted(names):
+        state = read_config_file(get_machine_path(name), machine_state_from_json)
+        if state is not None:
+            machines[name] = state
+
+    return {
+        "primary_machine": primary_machine,
+        "machines": machines,
+        "last_changes": index.get("last_changes", {}),
+    }
 
 
-def save_config(config: ConfigDict) -> None:
-    r"""Save the configuration to the JSON file specified by CONFIG_PATH.
+def save_config(
+    config: ConfigDict,
+    machine_names: List[str] | None = None,
+) -> None:
+    r"""Save the configuration to INDEX_PATH and the machine files.
 
-    Converts all sets in the config dictionary to sorted lists before saving,
-    as JSON doesn't support set serialization. The configuration structure is:
+    The primary machine designation and sync information are written to
+    INDEX_PATH. Each machine's package state is written to its own file in
+    MACHINES_DIR, so saving one machine doesn't re-serialize all the others.
+    Sets in the config dictionary are written as sorted lists, as JSON doesn't
+    support set serialization. The configuration structure is:
     {
         "primary_machine": Optional[str],
         "machines": {
@@ -159,33 +503,367 @@ def save_config(config: ConfigDict) -> None:
 
     Args:
         config: Configuration dictionary containing machine package states
-               and sync information. Sets will be converted to sorted lists
-               before saving.
+               and sync information. Sets will be written as sorted lists.
+        machine_names: Machines whose package state to write. If None, all
+               machines in the config are written.
 
     Side Effects:
-        - Creates CONFIG_PATH parent directories if they don't exist
-        - Writes the configuration to CONFIG_PATH in JSON format
-        - Overwrites existing configuration file if it exists
+        - Creates CONFIG_DIR and MACHINES_DIR if they don't exist
+        - Atomically replaces the written machine files, and INDEX_PATH if
+          its contents changed
 
     Raises:
         OSError: If there are filesystem permission issues or other IO errors
         TypeError: If the config contains types that can't be JSON serialized
 
     """
-    config_copy = sets_to_lists(config)
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(config_copy, f, indent=2, sort_keys=True)
+    MACHINES_DIR.mkdir(parents=True, exist_ok=True)
+
+    if machine_names is None:
+        machine_names = list(config["machines"])
+    for name in machine_names:
+        write_file_atomic(
+            get_machine_path(name), json_dumps(config["machines"][name])
+        )
+
+    index = {
+        "primary_machine": config["primary_machine"],
+        "last_changes": config.get("last_changes", {}),
+    }
+    # The index only changes when the primary machine does, so most saves
+    # write just the synced machine's file
+    if read_config_file(INDEX_PATH) != index:
+        write_file_atomic(INDEX_PATH, json_dumps(index))
+
+
+@functools.lru_cache(maxsize=None)
+def find_command(command: str) -> str | None:
+    r"""Find a command in PATH.
+
+    PATH is scanned only once per command and process; later lookups of the
+    same command are answered from a cache.
+
+    Args:
+        command: Name of the executable to look for
+
+    Returns:
+        The full path of the command, or None if it is not in PATH
+
+    """
+    return shutil.which(command)
+
+
+def check_command_exists(command: str) -> bool:
+    r"""Check whether a command is available in PATH.
+
+    Scans PATH in-process rather than spawning 'which', see find_command.
+
+    Args:
+        command: Name of the executable to look for
+
+    Returns:
+        bool: True if the command was found in PATH, False otherwise
+
+    """
+    return find_command(command) is not None
+
+
+def resolve_command(cmd: list[str]) -> list[str]:
+    r"""Replace the executable of a command with its full path.
+
+    subprocess only uses the faster posix_spawn() instead of fork/exec when
+    the executable is given as a path and close_fds is False. Passing
+    close_fds=False is safe here: Python creates its file descriptors
+    non-inheritable (PEP 446), so none leak into the child either way.
+
+    Args:
+        cmd: Command and arguments to execute
+
+    Returns:
+        list[str]: The command with its executable resolved through
+        find_command, or cmd unchanged if the executable is not in PATH
+
+    """
+    executable = find_command(cmd[0])
+    if executable is None:
+        return cmd
+    return [executable, *cmd[1:]]
+
+
+def kill_process_group(pgid: int) -> None:
+    r"""Kill every process of a process group.
+
+    Args:
+        pgid: ID of the process group to kill
+
+    """
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass  # Every process of the group has exited already
+
+
+def kill_running_commands() -> None:
+    r"""Kill all commands currently run by tail_command, in any thread.
+
+    Their commands run in their own sessions, so Ctrl-C doesn't reach them
+    through the terminal, and worker threads never see KeyboardInterrupt.
+    The main thread calls this before re-raising, so it doesn't have to wait
+    for the commands to finish or time out.
+
+    """
+    with RUNNING_GROUPS_LOCK:
+        pgids = list(RUNNING_GROUPS)
+    for pgid in pgids:
+        kill_process_group(pgid)
+
+
+def tail_command(
+    cmd: list[str],
+    timeout: float | None = None,
+    max_lines: int = UPDATE_OUTPUT_LINES,
+) -> tuple[int, str]:
+    r"""Run a package manager command and keep the end of its output.
+
+    stdout and stderr are merged and read line by line into a bounded
+    buffer, so memory use doesn't grow with chatty commands like
+    'brew upgrade'. The command is executed directly rather than through a
+    shell, see resolve_command.
+
+    The command runs in its own session, so on timeout its helper processes
+    (pip, curl, ...) are killed along with it. Otherwise they would keep the
+    output pipe open and reading would block until they exit. Starting a new
+    session rules out subprocess's posix_spawn() path, so unlike the other
+    commands this one is started with fork/exec. Its process group is
+    registered in RUNNING_GROUPS while it runs, see kill_running_commands.
+
+    Args:
+        cmd: Command and arguments to execute
+        timeout: Maximum time in seconds to wait for the command, or None to
+        wait indefinitely
+        max_lines: Number of trailing output lines to keep
+
+    Returns:
+        tuple: (returncode, output) where output holds the last max_lines
+        lines, preceded by a note if earlier lines were dropped
+
+    Raises:
+        subprocess.TimeoutExpired: If the command is still running when the
+        timeout expires. The command and its helper processes are killed
+        first.
+
+    """
+    tail = collections.deque(maxlen=max_lines)
+    line_count = 0
+    timed_out = threading.Event()
+
+    with subprocess.Popen(
+        resolve_command(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        start_new_session=True,
+    ) as proc:
+
+        def on_timeout():
+            # Only a command that is still running timed out. If it exited
+            # but left helpers holding the pipe, those are killed and the
+            # command's own exit status is kept.
+            if proc.poll() is None:
+                timed_out.set()
+            kill_process_group(proc.pid)
+
+        with RUNNING_GROUPS_LOCK:
+            RUNNING_GROUPS.add(proc.pid)
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, on_timeout)
+            timer.start()
+        try:
+            for line in proc.stdout:
+                tail.append(line)
+                line_count += 1
+            returncode = proc.wait()
+        except BaseException:
+            # Don't leave the command running in its own session, e.g. after
+            # Ctrl-C, which no longer reaches it through the terminal
+            kill_process_group(proc.pid)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with RUNNING_GROUPS_LOCK:
+                RUNNING_GROUPS.discard(proc.pid)
+
+    output = "".join(tail)
+    if line_count > len(tail):
+        output = f"... ({line_count - len(tail)} earlier lines omitted)\n{output}"
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout, output=output)
+    return returncode, output
+
+
+def stream_command(cmd: list[str], label: str) -> int:
+    r"""Run a command and print its output line by line as it is produced.
+
+    stdout and stderr are merged and each line is printed as soon as the
+    command writes it, instead of buffering the whole output until the command
+    exits. Lines are prefixed with label so the output of commands running
+    concurrently stays attributable.
+
+    Args:
+        cmd: Command and arguments to execute
+        label: Prefix for each output line, e.g. the package name
+
+    Returns:
+        int: The exit status of the command
+
+    """
+    with subprocess.Popen(
+        resolve_command(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        close_fds=False,
+    ) as proc:
+        for line in proc.stdout:
+            with OUTPUT_LOCK:
+                print(f"  [{label}] {line.rstrip()}")
+        return proc.wait()
+
+
+def get_package_state_dirs(
+    pkg_type: Literal["brew", "flatpak", "pipx"],
+) -> list[Path]:
+    r"""Get the directories whose contents mirror a package manager's packages.
+
+    Installing or removing a package adds or removes an entry in one of these
+    directories, which updates the directory's modification time.
+
+    Args:
+        pkg_type: Package manager to use. Must be one of:
+        'brew', 'flatpak', or 'pipx'
+
+    Returns:
+        list[Path]: The existing state directories of the package manager.
+        Empty if none of them exist.
+
+    """
+    if pkg_type == "brew":
+        prefix = os.environ.get("HOMEBREW_PREFIX")
+        if prefix is None:
+            brew = find_command("brew")
+            if brew is None:
+                return []
+            # <prefix>/bin/brew
+            prefix = Path(brew).parent.parent
+        dirs = [Path(prefix) / "Cellar"]
+    elif pkg_type == "flatpak":
+        dirs = [
+            Path("~/.local/share/flatpak/app").expanduser(),
+            Path("/var/lib/flatpak/app"),
+        ]
+    elif pkg_type == "pipx":
+        pipx_home = os.environ.get("PIPX_HOME")
+        if pipx_home is None:
+            # pipx keeps using the legacy location if it already exists
+            legacy_home = Path("~/.local/pipx").expanduser()
+            if legacy_home.exists():
+                pipx_home = legacy_home
+            else:
+                pipx_home = Path("~/.local/share/pipx").expanduser()
+        dirs = [Path(pipx_home) / "venvs"]
+    else:
+        return []
+
+    return [path for path in dirs if path.is_dir()]
+
+
+def load_package_cache() -> Dict[str, Any]:
+    r"""Load the package query cache from PKG_CACHE_PATH.
+
+    Returns:
+        Dict[str, Any]: The cached queries, keyed by package manager:
+            {
+                "<pkg_type>": {
+                    "mtime": list[int],  # st_mtime_ns of each state directory
+                    "packages": list[str]
+                },
+                ...
+            }
+        An empty dictionary if the cache is missing or unreadable.
+
+    """
+    try:
+        cache = read_json_file(PKG_CACHE_PATH)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def cached_by_mtime(
+    pkg_type: Literal["brew", "flatpak", "pipx"],
+) -> Callable[[Callable[[], set[str]]], Callable[[], set[str]]]:
+    r"""Cache a package query until the package manager's state changes.
+
+    The decorated query is only executed if the modification times of the
+    package manager's state directories differ from the ones recorded with
+    the cached result. Otherwise the cached package set is returned without
+    spawning the package manager. Empty results are not cached, so a failed
+    query is retried on the next run.
+
+    Args:
+        pkg_type: Package manager the decorated query belongs to
+
+    Returns:
+        A decorator for a function returning the set of installed packages
+
+    """
+    def decorator(query: Callable[[], set[str]]) -> Callable[[], set[str]]:
+        @functools.wraps(query)
+        def wrapper() -> set[str]:
+            dirs = get_package_state_dirs(pkg_type)
+            if not dirs:
+                return query()
+
+            mtime = [path.stat().st_mtime_ns for path in dirs]
+            with PKG_CACHE_LOCK:
+                entry = load_package_cache().get(pkg_type)
+            if entry and entry.get("mtime") == mtime:
+                return set(entry["packages"])
+
+            packages = query()
+            if not packages:
+                return packages
+
+            with PKG_CACHE_LOCK:
+                cache = load_package_cache()
+                cache[pkg_type] = {"mtime": mtime, "packages": sorted(packages)}
+                PKG_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                # Losing the cache only costs a query, no need to fsync
+                write_file_atomic(
+                    PKG_CACHE_PATH, json_dumps(cache, pretty=False), durable=False
+                )
+            return packages
+
+        return wrapper
+
+    return decorator
 
 
 def get_pipx_packages() -> set[str]:
     r"""Get the list of installed pipx packages.
 
-    Executes 'pipx list --json' to retrieve all installed packages in JSON
-    format. Parses the JSON output to extract package names from the virtual
-    environments. Handles error cases gracefully by returning an empty set.
+    pipx installs every package in its own virtual environment under
+    <PIPX_HOME>/venvs, so the package names are read directly from that
+    directory. This avoids starting pipx, which builds a detailed report of
+    every environment. If the directory doesn't exist, falls back to
+    executing 'pipx list --json' and extracting the package names from the
+    virtual environments in its output.
 
     Note:
-        This function assumes pipx's JSON output structure contains a 'venvs'
+        The fallback assumes pipx's JSON output structure contains a 'venvs'
         key mapping to a dictionary of virtual environments.
 
     Returns:
@@ -202,20 +880,33 @@ def get_pipx_packages() -> set[str]:
         {'black', 'mypy', 'ruff'}
 
     """
+    if not check_command_exists("pipx"):
+        return set()
+
+    venvs_dirs = get_package_state_dirs("pipx")
+    if venvs_dirs:
+        try:
+            with os.scandir(venvs_dirs[0]) as entries:
+                return {entry.name for entry in entries if entry.is_dir()}
+        except OSError:
+            pass  # Let pipx report its packages instead
+
     try:
         result = subprocess.run(
-            ["pipx", "list", "--json"], 
+            resolve_command(["pipx", "list", "--json"]),
+            close_fds=False,
             capture_output=True, 
-            text=True,
             check=False  # Don't raise CalledProcessError on non-zero return codes
         )
         if result.returncode != 0:
             return set()
-        return set(json.loads(result.stdout)["venvs"].keys())
+        # Both JSON parsers accept the raw bytes, no need to decode first
+        return set(json_loads(result.stdout)["venvs"].keys())
     except (FileNotFoundError, json.JSONDecodeError, KeyError):
         return set()
 
 
+@cached_by_mtime("brew")
 def get_brew_packages() -> set[str]:
     r"""Get the list of installed Homebrew formula packages.
 
@@ -241,22 +932,23 @@ def get_brew_packages() -> set[str]:
     """
     try:
         result = subprocess.run(
-            ["brew", "list", "--formula"], 
+            resolve_command(["brew", "list", "--formula"]),
+            close_fds=False,
             capture_output=True, 
-            text=True,
             check=False  # Don't raise CalledProcessError on non-zero return codes
         )
         if result.returncode != 0:
             return set()
 
-        # Filter out empty strings that might result from trailing newlines
-        packages = {pkg for pkg in result.stdout.strip().split("\n") if pkg}
-        return packages
+        # Split the raw output without decoding it as a whole, skipping
+        # empty lines
+        return {pkg.decode() for pkg in result.stdout.splitlines() if pkg}
 
     except FileNotFoundError:
         return set()
 
 
+@cached_by_mtime("flatpak")
 def get_flatpak_packages() -> set[str]:
     r"""Get the list of installed Flatpak applications.
 
@@ -286,17 +978,17 @@ def get_flatpak_packages() -> set[str]:
     """
     try:
         result = subprocess.run(
-            ["flatpak", "list", "--app", "--columns=application"],
+            resolve_command(["flatpak", "list", "--app", "--columns=application"]),
+            close_fds=False,
             capture_output=True,
-            text=True,
             check=False  # Don't raise CalledProcessError on non-zero return codes
         )
         if result.returncode != 0:
             return set()
 
-        # Filter out empty strings that might result from trailing newlines
-        packages = {pkg for pkg in result.stdout.strip().split("\n") if pkg}
-        return packages
+        # Split the raw output without decoding it as a whole, skipping
+        # empty lines
+        return {pkg.decode() for pkg in result.stdout.splitlines() if pkg}
 
     except FileNotFoundError:
         return set()
@@ -310,10 +1002,12 @@ def install_package(
 
     Attempts to install a single package using the appropriate package manager.
     The function supports three package managers: brew, flatpak, and pipx.
-    Installation status messages and any error output are printed to stdout.
+    Installation status messages and the package manager's output are printed
+    to stdout.
 
     Args:
-        pkg_type: Package manager to use. Must be one of: 'brew', 'flatpak', or 'pipx'
+        pkg_type: Package manager to use. Must be one of:
+        'brew', 'flatpak', or 'pipx'
         package: Name or ID of the package to install
 
     Returns:
@@ -326,13 +1020,9 @@ def install_package(
         Installing pipx package: black
         True
 
-        >>> install_package("flatpak", "org.mozilla.firefox")
-        Installing flatpak package: org.mozilla.firefox
-        True
-
     Notes:
-        - For flatpak installations, the -y flag is used to automatically accept prompts
-        - Installation errors will print the stderr output before returning False
+        - For flatpak installations, the -y flag is used to automatically
+          accept prompts
         - Requires the package manager to be installed and available in PATH
 
     """
@@ -343,58 +1033,170 @@ def install_package(
     elif pkg_type == "pipx":
         cmd = ["pipx", "install", package]
 
-    print(f"Installing {pkg_type} package: {package}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Failed to install {package}: {result.stderr}")
+    with OUTPUT_LOCK:
+        print(f"Installing {pkg_type} package: {package}")
+    returncode = stream_command(cmd, package)
+    if returncode != 0:
+        with OUTPUT_LOCK:
+            print(
+                f"Failed to install {pkg_type} package {package} "
+                f"(exit status {returncode})"
+            )
         return False
     return True
 
 
-def remove_package(pkg_type, package):
-    r"""Remove a package of the specified type.
+def install_packages(pkg_type, packages):
+    r"""Install several packages of the specified type.
 
-    Attempts to remove a single package using the appropriate package manager.
-    Prints status messages and captures any error output.
+    brew and flatpak accept multiple packages per invocation, so all packages
+    are installed with a single command, letting the package manager resolve
+    dependencies and load its metadata only once. If the batch command fails,
+    each package is retried on its own so failures are reported per package.
+    pipx installs every package into its own virtual environment and cannot
+    batch, so its installs run concurrently instead.
 
     Args:
-        pkg_type: String indicating package manager ('pipx', 'brew', or
-        'flatpak') package: String name/ID of the package to remove
+        pkg_type: String indicating package manager ('brew', 'flatpak' or
+        'pipx')
+        packages: Names/IDs of the packages to install
 
     Returns:
-        bool: True if removal succeeded, False if it failed
+        set[str]: The packages that were installed successfully
 
     """
+    packages = sorted(packages)
+    if not packages:
+        return set()
+
+    if pkg_type == "pipx":
+        workers = min(len(packages), MAX_PARALLEL_JOBS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda package: install_package(pkg_type, package), packages
+            )
+            return {pkg for pkg, ok in zip(packages, results) if ok}
+
     if pkg_type == "brew":
-        cmd = ["brew", "uninstall", package]
+        cmd = ["brew", "install", *packages]
     elif pkg_type == "flatpak":
-        cmd = ["flatpak", "uninstall", "-y", package]
-    elif pkg_type == "pipx":
+        cmd = ["flatpak", "install", "-y", *packages]
+
+    with OUTPUT_LOCK:
+        print(f"Installing {pkg_type} packages: {', '.join(packages)}")
+    if stream_command(cmd, pkg_type) == 0:
+        return set(packages)
+
+    with OUTPUT_LOCK:
+        print(
+            f"Batch install of {pkg_type} packages failed, retrying one by one"
+        )
+    return {pkg for pkg in packages if install_package(pkg_type, pkg)}
+
+
+def remove_package(
+    pkg_type: Literal["brew", "flatpak", "pipx"],
+    package: str,
+) -> bool:
+    r"""Remove a package using the specified package manager.
+
+    Attempts to remove a single package using the appropriate package manager.
+    Prints status messages and streams the package manager's output.
+
+    Args:
+        pkg_type: Package manager to use. Must be one of:
+        'brew', 'flatpak', or 'pipx'
+        package: Name or ID of the package to remove
+
+    Returns:
+        bool: True if removal succeeded, False if it failed
+
+    """
+    if pkg_type == "brew":
+        cmd = ["brew", "uninstall", package]
+    elif pkg_type == "flatpak":
+        cmd = ["flatpak", "uninstall", "-y", package]
+    elif pkg_type == "pipx":
         cmd = ["pipx", "uninstall", package]
 
-    print(f"Removing {pkg_type} package: {package}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Failed to remove {package}: {result.stderr}")
+    with OUTPUT_LOCK:
+        print(f"Removing {pkg_type} package: {package}")
+    returncode = stream_command(cmd, package)
+    if returncode != 0:
+        with OUTPUT_LOCK:
+            print(
+                f"Failed to remove {pkg_type} package {package} "
+                f"(exit status {returncode})"
+            )
         return False
     return True
 
 
+def remove_packages(pkg_type, packages):
+    r"""Remove several packages of the specified type.
+
+    brew and flatpak accept multiple packages per invocation, so all packages
+    are removed with a single command. If the batch command fails, each
+    package is retried on its own so failures are reported per package. pipx
+    can only remove one package per invocation, so its removals run
+    concurrently instead.
+
+    Args:
+        pkg_type: String indicating package manager ('brew', 'flatpak' or
+        'pipx')
+        packages: Names/IDs of the packages to remove
+
+    Returns:
+        set[str]: The packages that were removed successfully
+
+    """
+    packages = sorted(packages)
+    if not packages:
+        return set()
+
+    if pkg_type == "pipx":
+        workers = min(len(packages), MAX_PARALLEL_JOBS)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda package: remove_package(pkg_type, package), packages
+            )
+            return {pkg for pkg, ok in zip(packages, results) if ok}
+
+    if pkg_type == "brew":
+        cmd = ["brew", "uninstall", *packages]
+    elif pkg_type == "flatpak":
+        cmd = ["flatpak", "uninstall", "-y", *packages]
+
+    with OUTPUT_LOCK:
+        print(f"Removing {pkg_type} packages: {', '.join(packages)}")
+    if stream_command(cmd, pkg_type) == 0:
+        return set(packages)
+
+    with OUTPUT_LOCK:
+        print(
+            f"Batch removal of {pkg_type} packages failed, retrying one by one"
+        )
+    return {pkg for pkg in packages if remove_package(pkg_type, pkg)}
+
+
 def update_packages(
     pkg_type: Literal["brew", "flatpak", "pipx"],
     timeout: float = 60,
+    out: io.TextIOBase | None = None,
 ) -> tuple[bool, bool]:
     r"""Update all packages of the specified package manager.
 
     Attempts to update all installed packages using the specified package
-    manager. The operation has a configurable timeout to prevent hanging. Status
-    messages and any error output are printed to stdout.
+    manager. The operation has a configurable timeout to prevent hanging.
+    Status messages and any error output are printed to out.
 
     Args:
         pkg_type: Package manager to use. Must be one of:
         'brew', 'flatpak', or 'pipx'
         timeout: Maximum time in seconds to wait for the update operation to
         complete
+        out: File-like object status messages are printed to, defaults to
+        sys.stdout
 
     Returns:
         A tuple of (success, is_timeout) where:
@@ -402,296 +1204,191 @@ def update_packages(
             - is_timeout: True if the operation exceeded the timeout duration
 
     Examples:
-        >>> update_packages("pipx")  # Default 60s timeout
-        Updating pipx packages...
-        (True, False)
-
         >>> update_packages("flatpak", timeout=120)  # Extended timeout
         Updating flatpak packages...
         (True, False)
 
     Notes:
-        - For brew updates, uses --ignore-dependencies flag
         - For flatpak updates, -y flag is used to automatically accept prompts
         - Timeouts are treated as update failures (success=False)
-        - Non-timeout errors print diagnostic information before returning
+        - A successful update records its time, see is_recently_updated
 
     """
     if pkg_type == "brew":
-        cmd = ["brew", "upgrade", "--ignore-dependencies"]  # Fixed typo in dependencies
+        cmd = ["brew", "upgrade"]
     elif pkg_type == "flatpak":
         cmd = ["flatpak", "update", "-y"]
     elif pkg_type == "pipx":
         cmd = ["pipx", "upgrade-all"]
     else:
-        print(f"Unknown package type: {pkg_type}")
+        print(f"Unknown package type: {pkg_type}", file=out)
         return False, False
 
-    print(f"\nUpdating {pkg_type} packages...")
+    print(f"\nUpdating {pkg_type} packages...", file=out)
     try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=timeout
-        )
+        returncode, output = tail_command(cmd, timeout=timeout)
 
-        if result.returncode != 0:
-            print(f"Failed to update {pkg_type} packages: {result.stderr}")
-            if result.stdout.strip():
-                print(result.stdout)
+        if returncode != 0:
+            print(
+                f"Failed to update {pkg_type} packages "
+                f"(exit status {returncode})",
+                file=out,
+            )
+            if output.strip():
+                print(output, file=out)
             return False, False
 
-        if result.stdout.strip():
-            print(result.stdout)
+        if output.strip():
+            print(output, file=out)
 
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        get_update_stamp_path(pkg_type).touch()
         return True, False
 
     except subprocess.TimeoutExpired:
-        print(f"Timeout while updating {pkg_type} packages (>{timeout}s)")
+        print(
+            f"Timeout while updating {pkg_type} packages (>{timeout}s)",
+            file=out,
+        )
         return False, True
     except Exception as e:
-        print(f"Unexpected error while updating {pkg_type} packages: {str(e)}")
+        print(
+            f"Unexpected error while updating {pkg_type} packages: {str(e)}",
+            file=out,
+        )
         return False, False
 
 
-def update_all_packages():
-    r"""Get all installed packages from all supported package managers.
+def run_package_managers(pkg_types, func, default=None, buffered=True):
+    r"""Run an operation for several package managers.
 
-    Retrieves the complete list of installed packages from pipx, brew, and
-    flatpak. Packages that fail to retrieve are represented as empty sets.
+    brew runs first and on its own: on the usual macOS setup pipx and its
+    Python come from Homebrew, and brew can replace them while they are in
+    use. The remaining package managers don't share any state and run at the
+    same time. If buffered, each of those prints into its own buffer, which
+    is flushed to stdout as a whole once it finishes or fails, so the output
+    of different package managers is never interleaved. Otherwise func must
+    keep its output attributable itself. An operation running alone prints
+    directly.
 
-    Returns:
-        dict: A dictionary with package manager names as keys and sets of
-        installed packages as values. Format:
-              {
-                  'brew': {pkg1, pkg2, ...},
-                  'flatpak': {pkg1, pkg2, ...},
-                  'pipx': {pkg1, pkg2, ...}
-              }
+    An exception raised for one package manager is reported and doesn't stop
+    the others.
 
-    """
-    # First check internet connectivity
-    print("Checking internet connectivity...")
-    is_connected, latency = check_internet_connection()
+    Args:
+        pkg_types: The package managers to run the operation for
+        func: Called as func(pkg_type, out), where out is the file-like
+        object to print to, or None for stdout
+        default: Result recorded for a package manager whose operation raised
+        an exception
+        buffered: Buffer the output of operations running at the same time
 
-    if not is_connected:
-        print("\nERROR: No internet connectivity detected.")
-        print("Please check your internet connection and try again.")
-        return False
+    Returns:
+        dict: The result of func for each package manager
 
-    print(f"Internet connection detected (latency: {latency:.1f}ms)")
+    """
+    exclusive = [pkg_type for pkg_type in pkg_types if pkg_type == "brew"]
+    shared = [pkg_type for pkg_type in pkg_types if pkg_type != "brew"]
 
-    # Adjust timeouts based on latency
-    base_timeout = max(60, int(latency / 10))  # 60s minimum, or 100x ping time
-    retry_timeout = base_timeout * 3
+    def run(pkg_type, out=None):
+        try:
+            return func(pkg_type, out)
+        except Exception as e:
+            with OUTPUT_LOCK:
+                print(f"\nERROR: {pkg_type} failed: {e}", file=out)
+            return default
+
+    def run_buffered(pkg_type):
+        out = io.StringIO()
+        try:
+            return run(pkg_type, out)
+        finally:
+            with OUTPUT_LOCK:
+                print(out.getvalue(), end="")
 
-    pkg_types = ["brew", "flatpak", "pipx"]
     results = {}
-    timeout_failures = []
-
-    # First pass - quick timeout
-    for pkg_type in pkg_types:
-        if not any(
-            [
-                pkg_type == "brew" and shutil.which("brew"),
-                pkg_type == "flatpak" and shutil.which("flatpak"),
-                pkg_type == "pipx" and shutil.which("pipx"),
-            ]
-        ):
+    for group in (exclusive, shared):
+        if len(group) <= 1:
+            for pkg_type in group:
+                results[pkg_type] = run(pkg_type)
             continue
 
-        success, is_timeout = update_packages(pkg_type, timeout=base_timeout)
-        if is_timeout:
-            timeout_failures.append(pkg_type)
-        else:
-            results[pkg_type] = success
-
-    # If we had timeouts, check connectivity again before retrying
-    if timeout_failures:
-        print("\nChecking internet connection before retrying...")
-        is_connected, new_latency = check_internet_connection()
-
-        if not is_connected:
-            print("\nWARNING: Internet connection lost during updates.")
-            print("Remaining updates cancelled.")
-            return False
-
-        if new_latency > latency * 2:
-            print(f"\nWARNING: Network latency has increased significantly")
-            print(f"Original: {latency:.1f}ms, Current: {new_latency:.1f}ms")
-
-        # Only retry if some updates succeeded or if latency is reasonable
-        if any(results.values()) or new_latency < 1000:  # 1 second threshold
-            print("\nRetrying timed out updates with extended timeout...")
-            for pkg_type in timeout_failures:
-                success, _ = update_packages(pkg_type, timeout=retry_timeout)
-                results[pkg_type] = success
-        else:
-            print("\nNetwork conditions too poor to retry updates.")
-            for pkg_type in timeout_failures:
-                results[pkg_type] = False
-
-    # Analyze results
-    failed = [pkg for pkg, success in results.items() if not success]
-
-    # Print summary
-    if failed:
-        print("\nUpdate summary:")
-        print(f"Failed updates: {', '.join(failed)}")
-        print("You may want to try updating these package managers manually")
-
-    return len(failed) == 0
-
-
-def get_all_packages():
-    r"""Get all installed packages."""
-    return {
-        "brew": get_brew_packages(),
-        "flatpak": get_flatpak_packages(),
-        "pipx": get_pipx_packages(),
-    }
+        worker = run_buffered if buffered else run
+        with ThreadPoolExecutor(max_workers=len(group)) as executor:
+            futures = {
+                executor.submit(worker, pkg_type): pkg_type for pkg_type in group
+            }
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except BaseException:
+                # Otherwise leaving the executor waits for the other workers'
+                # commands, e.g. after Ctrl-C
+                kill_running_commands()
+                raise
+    return results
 
 
-def print_package_state(machine_name, packages):
-    r"""Print the package state for a machine.
-
-    Displays a formatted summary of all installed packages, grouped by package manager.
-    Sorts package managers and package names alphabetically for consistent output.
+def get_update_stamp_path(pkg_type):
+    r"""Get the file whose modification time records the last update.
 
     Args:
-        machine_name: String name of the machine
-        packages: Dictionary of package sets by package manager type
-
-    """
-    print(f"\nPackages for {machine_name}:")
-    for pkg_type in sorted(["brew", "flatpak", "pipx"]):
-        pkgs = packages.get(pkg_type, set())
-        if pkgs:
-            print(f"{pkg_type:8} ({len(pkgs):2}): {', '.join(sorted(pkgs))}")
-
-
-def install_package(pkg_type, package):
-    r"""Install a package of the specified type.
-
-    Attempts to install a single package using the appropriate package manager.
-    Prints status messages and captures any error output.
-
-    Args:
-        pkg_type: String indicating package manager ('brew', 'flatpak' or
-        'pipx')
-        package: String name/ID of the package to install
+        pkg_type: The package manager ('pipx', 'brew', or 'flatpak')
 
     Returns:
-        bool: True if installation succeeded, False if it failed
+        Path: The stamp file in CACHE_DIR, which may not exist yet
 
     """
-    if pkg_type == "brew":
-        cmd = ["brew", "install", package]
-    elif pkg_type == "flatpak":
-        cmd = ["flatpak", "install", "-y", package]
-    elif pkg_type == "pipx":
-        cmd = ["pipx", "install", package]
-
-    print(f"Installing {pkg_type} package: {package}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Failed to install {package}: {result.stderr}")
-        return False
-    return True
+    return CACHE_DIR / f"{pkg_type}.updated"
 
 
-def remove_package(pkg_type, package):
-    r"""Remove a package of the specified type.
-
-    Attempts to remove a single package using the appropriate package manager.
-    Prints status messages and captures any error output.
+def is_recently_updated(pkg_type, max_age=UPDATE_MAX_AGE):
+    r"""Check whether a package manager was updated successfully recently.
 
     Args:
-        pkg_type: String indicating package manager ('pipx', 'brew', or
-        'flatpak')
-        package: String name/ID of the package to remove
+        pkg_type: The package manager ('pipx', 'brew', or 'flatpak')
+        max_age: Maximum age in seconds of the last successful update
 
     Returns:
-        bool: True if removal succeeded, False if it failed
+        bool: True if the last successful update is less than max_age seconds
+        old, False if it is older or no update was recorded
 
     """
-    if pkg_type == "brew":
-        cmd = ["brew", "uninstall", package]
-    elif pkg_type == "flatpak":
-        cmd = ["flatpak", "uninstall", "-y", package]
-    elif pkg_type == "pipx":
-        cmd = ["pipx", "uninstall", package]
-
-    print(f"Removing {pkg_type} package: {package}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Failed to remove {package}: {result.stderr}")
+    try:
+        last_update = get_update_stamp_path(pkg_type).stat().st_mtime
+    except FileNotFoundError:
         return False
-    return True
+    return time.time() - last_update < max_age
+
 
+def update_all_packages(force=False):
+    r"""Update all packages of all available package managers.
 
-def update_packages(pkg_type, timeout=60):
-    r"""Update all packages of the specified type.
+    Package managers that were updated successfully within the last
+    UPDATE_MAX_AGE seconds are skipped unless force is set. Timeouts are
+    derived from the measured network latency, and updates that time out are
+    retried once with a longer timeout if the network allows it.
 
     Args:
-        pkg_type: The package manager to use ('pipx', 'brew', or 'flatpak')
-        timeout: Maximum time in seconds to wait for the update
+        force: Update package managers even if they were updated recently
 
     Returns:
-        tuple: (success, is_timeout) where:
-            - success is True if update completed successfully
-            - is_timeout is True if the operation timed out
+        bool: True if all attempted updates succeeded, False otherwise
 
     """
-    if pkg_type == "brew":
-        cmd = ["brew", "upgrade"]
-    elif pkg_type == "flatpak":
-        cmd = ["flatpak", "update", "-y"]
-    elif pkg_type == "pipx":
-        cmd = ["pipx", "upgrade-all"]
-    else:
-        print(f"Unknown package type: {pkg_type}")
-        return False, False
-
-    print(f"\nUpdating {pkg_type} packages...")
-    try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=timeout
-        )
-
-        if result.returncode != 0:
-            print(f"Failed to update {pkg_type} packages: {result.stderr}")
-            if result.stdout.strip():
-                print(result.stdout)
-            return False, False
-
-        if result.stdout.strip():
-            print(result.stdout)
-
-        return True, False
-
-    except subprocess.TimeoutExpired:
-        print(f"Timeout while updating {pkg_type} packages (>{timeout}s)")
-        return False, True
-    except Exception as e:
-        print(f"Unexpected error while updating {pkg_type} packages: {str(e)}")
-        return False, False
-
-
-def update_all_packages():
-    r"""Get all installed packages from all supported package managers.
-
-    Retrieves the complete list of installed packages from pipx, brew, and
-    flatpak. Packages that fail to retrieve are represented as empty sets.
+    # Resolve which package managers to update before touching the network
+    available = [
+        pkg_type for pkg_type in PKG_TYPES if check_command_exists(pkg_type)
+    ]
+    to_update = []
+    for pkg_type in available:
+        if not force and is_recently_updated(pkg_type):
+            print(f"\nSkipping {pkg_type} update, it was updated recently")
+            continue
+        to_update.append(pkg_type)
 
-    Returns:
-        dict: A dictionary with package manager names as keys and sets of installed
-              packages as values. Format:
-              {
-                  'brew': {pkg1, pkg2, ...},
-                  'flatpak': {pkg1, pkg2, ...},
-                  'pipx': {pkg1, pkg2, ...}
-              }
+    if not to_update:
+        return True
 
-    """
     # First check internet connectivity
     print("Checking internet connectivity...")
     is_connected, latency = check_internet_connection()
@@ -707,22 +1404,18 @@ def update_all_packages():
     base_timeout = max(60, int(latency / 10))  # 60s minimum, or 100x ping time
     retry_timeout = base_timeout * 3
 
-    pkg_types = ["brew", "flatpak", "pipx"]
     results = {}
     timeout_failures = []
 
     # First pass - quick timeout
-    for pkg_type in pkg_types:
-        if not any(
-            [
-                pkg_type == "brew" and shutil.which("brew"),
-                pkg_type == "flatpak" and shutil.which("flatpak"),
-                pkg_type == "pipx" and shutil.which("pipx"),
-            ]
-        ):
-            continue
-
-        success, is_timeout = update_packages(pkg_type, timeout=base_timeout)
+    first_pass = run_package_managers(
+        to_update,
+        lambda pkg_type, out: update_packages(
+            pkg_type, timeout=base_timeout, out=out
+        ),
+        default=(False, False),
+    )
+    for pkg_type, (success, is_timeout) in first_pass.items():
         if is_timeout:
             timeout_failures.append(pkg_type)
         else:
@@ -745,8 +1438,14 @@ def update_all_packages():
         # Only retry if some updates succeeded or if latency is reasonable
         if any(results.values()) or new_latency < 1000:  # 1 second threshold
             print("\nRetrying timed out updates with extended timeout...")
-            for pkg_type in timeout_failures:
-                success, _ = update_packages(pkg_type, timeout=retry_timeout)
+            retries = run_package_managers(
+                timeout_failures,
+                lambda pkg_type, out: update_packages(
+                    pkg_type, timeout=retry_timeout, out=out
+                ),
+                default=(False, False),
+            )
+            for pkg_type, (success, _) in retries.items():
                 results[pkg_type] = success
         else:
             print("\nNetwork conditions too poor to retry updates.")
@@ -765,13 +1464,39 @@ def update_all_packages():
     return len(failed) == 0
 
 
+def get_packages(pkg_type):
+    r"""Get the installed packages of the specified type.
+
+    Args:
+        pkg_type: String indicating package manager ('brew', 'flatpak' or
+        'pipx')
+
+    Returns:
+        set[str]: The installed packages, empty for unknown package managers
+
+    """
+    if pkg_type == "brew":
+        return get_brew_packages()
+    elif pkg_type == "flatpak":
+        return get_flatpak_packages()
+    elif pkg_type == "pipx":
+        return get_pipx_packages()
+    return set()
+
+
 def get_all_packages():
-    r"""Get all installed packages."""
-    return {
-        "brew": get_brew_packages(),
-        "flatpak": get_flatpak_packages(),
-        "pipx": get_pipx_packages(),
-    }
+    r"""Get all installed packages.
+
+    The package managers are queried concurrently, since each query is
+    dominated by the package manager's own startup time.
+
+    """
+    with ThreadPoolExecutor(max_workers=len(PKG_TYPES)) as executor:
+        futures = {
+            pkg_type: executor.submit(get_packages, pkg_type)
+            for pkg_type in PKG_TYPES
+        }
+        return {pkg_type: future.result() for pkg_type, future in futures.items()}
 
 
 def print_package_state(machine_name, packages):
@@ -786,22 +1511,125 @@ def print_package_state(machine_name, packages):
 
     """
     print(f"\nPackages for {machine_name}:")
-    for pkg_type in sorted(["pipx", "brew", "flatpak"]):
+    for pkg_type in PKG_TYPES:
         pkgs = packages.get(pkg_type, set())
         if pkgs:
             print(f"{pkg_type:8} ({len(pkgs):2}): {', '.join(sorted(pkgs))}")
 
 
+def sync_package_type(pkg_type, to_install, to_remove):
+    r"""Install and remove packages of a single package manager.
+
+    Args:
+        pkg_type: String indicating package manager ('brew', 'flatpak' or
+        'pipx')
+        to_install: Names/IDs of the missing packages to install
+        to_remove: Names/IDs of the extra packages to remove
+
+    Package managers that are not installed are skipped with a message.
+    Status messages are printed under OUTPUT_LOCK and include the package
+    manager, so they stay attributable while other package managers sync.
+
+    Returns:
+        set[str] | None: The installed packages of the package manager after
+        the changes, or None if no package was installed or removed
+
+    """
+    if not (to_install or to_remove):
+        return None
+    if not check_command_exists(pkg_type):
+        with OUTPUT_LOCK:
+            print(
+                f"\nSkipping missing {pkg_type} packages, {pkg_type} is not "
+                f"installed: {', '.join(sorted(to_install))}"
+            )
+        return None
+
+    changed = False
+
+    # Install missing packages
+    if to_install:
+        with OUTPUT_LOCK:
+            print(f"\nInstalling missing {pkg_type} packages:")
+        if install_packages(pkg_type, to_install):
+            changed = True
+
+    # Remove extra packages
+    if to_remove:
+        with OUTPUT_LOCK:
+            print(f"\nRemoving extra {pkg_type} packages:")
+        if remove_packages(pkg_type, to_remove):
+            changed = True
+
+    if not changed:
+        return None
+    return get_packages(pkg_type)
+
+
+def update_machine_state(config, machine_name, packages, timestamp):
+    r"""Record a machine's installed packages in the config if they changed.
+
+    The last_update timestamp is only set together with an actual change, so
+    an unchanged machine state doesn't require rewriting the config file.
+
+    Args:
+        config: Configuration dictionary as returned by load_config
+        machine_name: String name of the machine
+        packages: Dictionary of package sets by package manager type
+        timestamp: ISO format datetime to record as last_update
+
+    Returns:
+        bool: True if the config was modified, False if the recorded packages
+        already matched
+
+    """
+    machine = config["machines"].get(machine_name)
+    if machine is not None:
+        recorded = machine.get("packages", {})
+        if all(
+            recorded.get(pkg_type, set()) == packages.get(pkg_type, set())
+            for pkg_type in PKG_TYPES
+        ):
+            return False
+
+    config["machines"][machine_name] = {
+        "packages": packages,
+        "last_update": timestamp,
+    }
+    return True
+
+
 def sync_packages(machine_name, make_primary=False):
     """Sync packages for a machine."""
-    config = load_config()
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    config = load_config([machine_name])
     current_packages = get_all_packages()
 
     print("\nCurrent machine state:")
     print_package_state(machine_name, current_packages)
 
+    # Only write the config file if something in it actually changes
+    config_changed = False
+
+    # Without a recorded primary, only a machine that is the first to record
+    # its state may make itself primary. Otherwise INDEX_PATH was lost, e.g.
+    # corrupted or not (yet) copied by a file sync tool, and taking over
+    # would make the real primary sync against this machine.
+    if (
+        not make_primary
+        and config["primary_machine"] is None
+        and list_machines() - {machine_name}
+    ):
+        print("\nNo primary machine is recorded, but other machines have states.")
+        print(
+            "Rerun package-sync with --primary on the primary machine, or on "
+            f"{machine_name} to make it the primary machine."
+        )
+        return
+
     # Handle primary machine designation
     if make_primary or config["primary_machine"] is None:
+        config_changed = config["primary_machine"] != machine_name
         config["primary_machine"] = machine_name
         print(f"\nSetting {machine_name} as primary machine")
 
@@ -812,48 +1640,67 @@ def sync_packages(machine_name, make_primary=False):
         machine_name not in config["machines"]
         or machine_name == config["primary_machine"]
     ):
-        config["machines"][machine_name] = {
-            "packages": current_packages,
-            "last_update": datetime.now().isoformat(),
-        }
-        save_config(config)
-        print(f"\nUpdated state for {machine_name}")
+        if update_machine_state(config, machine_name, current_packages, now_iso):
+            config_changed = True
+            print(f"\nUpdated state for {machine_name}")
+        else:
+            print(f"\nState for {machine_name} is unchanged")
+
+        if config_changed:
+            save_config(config, [machine_name])
         return
 
     # For non-primary machines, sync with primary
-    primary_packages = config["machines"][config["primary_machine"]]["packages"]
-    changes_made = False
-
+    primary_machine = config["primary_machine"]
+    if primary_machine not in config["machines"]:
+        # The primary's state file is missing or was corrupted and moved to a
+        # .bak file. Syncing against an empty state would remove every
+        # package, so leave it to the user how to recover.
+        print(f"\nNo package state is recorded for {primary_machine}.")
+        print(
+            f"Run package-sync on {primary_machine} to record it again, or "
+            f"rerun with --primary to make {machine_name} the primary machine."
+        )
+        return
+    primary_packages = config["machines"][primary_machine]["packages"]
+
+    # Both sides are sets already: get_all_packages returns sets and
+    # load_config converts the recorded package lists
+    diffs = {}
+    for pkg_type in PKG_TYPES:
+        primary = primary_packages.get(pkg_type, set())
+        current = current_packages[pkg_type]
+        # Packages to install and to remove
+        diffs[pkg_type] = (primary - current, current - primary)
+
+    # brew is synced first, the other package managers at the same time, see
+    # run_package_managers. Installs and removals stream their output live
+    # with every line labelled, so it isn't buffered. Each package manager is
+    # re-queried as soon as its own changes are done.
     print("\nSyncing with primary machine...")
-    for pkg_type in ["pipx", "brew", "flatpak"]:
-        current = set(current_packages.get(pkg_type, []))
-        primary = set(primary_packages.get(pkg_type, []))
-
-        # Install missing packages
-        to_install = primary - current
-        if to_install:
-            print(f"\nInstalling missing {pkg_type} packages:")
-            for package in sorted(to_install):
-                if install_package(pkg_type, package):
-                    changes_made = True
-
-        # Remove extra packages
-        to_remove = current - primary
-        if to_remove:
-            print(f"\nRemoving extra {pkg_type} packages:")
-            for package in sorted(to_remove):
-                if remove_package(pkg_type, package):
-                    changes_made = True
+    synced = run_package_managers(
+        list(diffs),
+        lambda pkg_type, out: sync_package_type(pkg_type, *diffs[pkg_type]),
+        buffered=False,
+    )
 
-    if changes_made:
-        current_packages = get_all_packages()
+    changes_made = False
+    for pkg_type, packages in synced.items():
+        if packages is not None:
+            current_packages[pkg_type] = packages
+            changes_made = True
 
     # Update state
-    config["machines"][machine_name] = {
-        "packages": current_packages,
-        "last_update": datetime.now().isoformat(),
-    }
-    save_config(config)
+    if update_machine_state(config, machine_name, current_packages, now_iso):
+        config_changed = True
+    if config_changed:
+        save_config(config, [machine_name])
+
+    # Without changes the final state is the one printed above, so don't sort
+    # and print all package lists a second time
+    if not changes_made:
+        print("\nNo packages were changed")
+        return
 
     print("\nFinal state:")
     print_package_state(machine_name, current_packages)
@@ -871,11 +1718,17 @@ def main():
     parser.add_argument(
         "--update", action="store_true", help="Update all installed packages"
     )
+    parser.add_argument(
+        "--force-update",
+        action="store_true",
+        help="Like --update, but also update package managers that were "
+        "updated within the last hour",
+    )
     args = parser.parse_args()
 
-    if args.update:
+    if args.update or args.force_update:
         print("\nUpdating all packages...")
-        update_all_packages()
+        update_all_packages(force=args.force_update)
 
     sync_packages(args.machine_name, args.primary)
 